@@ -0,0 +1,236 @@
+"""
+Declarative action engine for IR key mappings.
+
+Each entry under `ir_codes` in config.yaml is compiled once, at config load,
+into an `Action`. The bridge then dispatches scancodes through a plain dict
+lookup instead of re-interpreting the config on every key press.
+
+Supported forms for an `ir_codes` value:
+
+    0x87ee01: "volume_up"                      # Bare action name
+    0x87ee04: {action: volume_up, step: 5}     # Action with parameters
+    0x87ee05: {action: volume_set, volume: 30} # Absolute volume preset
+    0x87ee06:                                  # Macro
+      macro:
+        - unmute
+        - {action: volume_set, volume: 25}
+        - {action: wait, ms: 500}
+        - {action: volume_up, step: 5}
+
+Macro steps run strictly in order. Every primitive except `wait` reads or
+writes the volume of the single System Leader, so steps cannot be pipelined.
+Instead, steps whose effect is overwritten by the very next step are dropped
+at compile time (e.g. `unmute` directly followed by `volume_set`), so they
+cost no round trips at all.
+"""
+import asyncio
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional
+
+if TYPE_CHECKING:
+    from main import PhantomBridge
+
+# An action body receives the running PhantomBridge, giving access to the
+# client and to bridge-level state such as the mute toggle.
+ActionFn = Callable[["PhantomBridge"], Awaitable[None]]
+
+
+class Action:
+    """
+    A compiled, ready-to-run action.
+
+    Attributes:
+        name (str): Human readable description used in logs.
+        kind (str): Primitive action name, or "macro".
+        long_running (bool): True for macros and waits, whose duration is not
+            bounded by a single request. The bridge restarts the debounce
+            window when these finish.
+    """
+    def __init__(self, name: str, kind: str, fn: ActionFn, long_running: bool = False):
+        self.name = name
+        self.kind = kind
+        self.long_running = long_running
+        self._fn = fn
+
+    async def __call__(self, bridge: "PhantomBridge") -> None:
+        await self._fn(bridge)
+
+    def __repr__(self) -> str:
+        return f"Action({self.name})"
+
+
+class _Primitive:
+    """Registry entry describing how to build a primitive action."""
+    def __init__(self, build: Callable[[dict, dict], ActionFn], params: frozenset):
+        self.build = build
+        self.params = params
+
+
+def _int_param(params: dict, key: str, default=None, low: Optional[int] = None, high: Optional[int] = None) -> int:
+    """
+    Read an integer parameter, validating its type and range.
+
+    Raises:
+        ValueError: If the value is missing (and no default), not an integer or out of range.
+    """
+    value = params.get(key, default)
+    if value is None:
+        raise ValueError(f"'{key}' is required")
+    # bool is an int subclass, but `step: true` is certainly a typo
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"'{key}' must be an integer, got {value!r}")
+    if low is not None and value < low:
+        raise ValueError(f"'{key}' must be at least {low}, got {value}")
+    if high is not None and value > high:
+        raise ValueError(f"'{key}' must be at most {high}, got {value}")
+    return value
+
+
+def _volume_step(sign: int, params: dict, defaults: dict) -> ActionFn:
+    # The global speaker.volume_step is validated by the bridge at load time
+    step = _int_param(params, "step", low=1) if "step" in params else defaults.get("volume_step", 2)
+
+    async def run(bridge):
+        current_vol = await bridge.client.get_volume()
+        await bridge.client.set_volume(current_vol + sign * step)
+    return run
+
+
+def _volume_up(params: dict, defaults: dict) -> ActionFn:
+    return _volume_step(1, params, defaults)
+
+
+def _volume_down(params: dict, defaults: dict) -> ActionFn:
+    return _volume_step(-1, params, defaults)
+
+
+def _volume_set(params: dict, defaults: dict) -> ActionFn:
+    volume = _int_param(params, "volume", low=0, high=100)
+
+    async def run(bridge):
+        await bridge.client.set_volume(volume)
+        bridge.is_muted = volume == 0
+    return run
+
+
+def _mute_toggle(params: dict, defaults: dict) -> ActionFn:
+    async def run(bridge):
+        # Soft mute is "volume 0", so derive the current state from the speaker
+        # rather than a local flag that presets and stepping can invalidate.
+        bridge.is_muted = await bridge.client.get_volume() > 0
+        await bridge.client.set_mute(bridge.is_muted)
+    return run
+
+
+def _set_mute(muted: bool) -> Callable[[dict, dict], ActionFn]:
+    def build(params: dict, defaults: dict) -> ActionFn:
+        async def run(bridge):
+            bridge.is_muted = muted
+            await bridge.client.set_mute(muted)
+        return run
+    return build
+
+
+def _wait(params: dict, defaults: dict) -> ActionFn:
+    seconds = _int_param(params, "ms", 0, low=0) / 1000.0
+
+    async def run(bridge):
+        await asyncio.sleep(seconds)
+    return run
+
+
+# Registry of primitive actions: builder and accepted parameter names.
+ACTIONS: dict[str, _Primitive] = {
+    "volume_up": _Primitive(_volume_up, frozenset({"step"})),
+    "volume_down": _Primitive(_volume_down, frozenset({"step"})),
+    "volume_set": _Primitive(_volume_set, frozenset({"volume"})),
+    "mute": _Primitive(_mute_toggle, frozenset()),
+    "mute_on": _Primitive(_set_mute(True), frozenset()),
+    "mute_off": _Primitive(_set_mute(False), frozenset()),
+    "unmute": _Primitive(_set_mute(False), frozenset()),
+    "wait": _Primitive(_wait, frozenset({"ms"})),
+}
+
+# Steps made redundant when directly followed by a `volume_set`: unmuting only
+# restores a volume that is about to be overwritten, as does an earlier preset.
+_OVERRIDDEN_BY_VOLUME_SET = frozenset({"mute_off", "unmute", "volume_set"})
+
+
+def _describe(name: str, params: dict) -> str:
+    if not params:
+        return name
+    args = ", ".join(f"{k}={v}" for k, v in params.items())
+    return f"{name}({args})"
+
+
+def _compile_macro(steps: list, defaults: dict) -> Action:
+    """Compile an ordered list of steps, dropping those the next step overrides."""
+    if not isinstance(steps, list) or not steps:
+        raise ValueError(f"macro must be a non-empty list of steps, got {steps!r}")
+    compiled = [compile_action(step, defaults) for step in steps]
+    compiled = [
+        action for action, following in zip(compiled, compiled[1:] + [None])
+        if not (following is not None and following.kind == "volume_set"
+                and action.kind in _OVERRIDDEN_BY_VOLUME_SET)
+    ]
+
+    async def run(bridge):
+        for action in compiled:
+            await action(bridge)
+    return Action("macro(" + " -> ".join(a.name for a in compiled) + ")", "macro", run, long_running=True)
+
+
+def compile_action(spec, defaults: dict) -> Action:
+    """
+    Compile a single `ir_codes` value into an Action.
+
+    Args:
+        spec: Action name, parameter mapping or macro mapping from config.yaml.
+        defaults (dict): Global settings (e.g. `volume_step` from the speaker section).
+
+    Raises:
+        ValueError: If the spec is malformed, names an unknown action or
+            carries unknown or invalid parameters.
+    """
+    if isinstance(spec, str):
+        name, params = spec, {}
+    elif isinstance(spec, dict) and "macro" in spec:
+        extra = set(spec) - {"macro"}
+        if extra:
+            raise ValueError(f"unexpected keys next to 'macro': {', '.join(sorted(map(str, extra)))}")
+        return _compile_macro(spec["macro"], defaults)
+    elif isinstance(spec, dict) and "action" in spec:
+        params = {k: v for k, v in spec.items() if k != "action"}
+        name = spec["action"]
+    else:
+        raise ValueError(f"Invalid action spec: {spec!r}")
+
+    if not isinstance(name, str):
+        raise ValueError(f"action name must be a string, got {name!r}")
+    primitive = ACTIONS.get(name)
+    if primitive is None:
+        raise ValueError(f"Unknown action '{name}'")
+    unknown = set(params) - primitive.params
+    if unknown:
+        raise ValueError(f"unknown parameters for '{name}': {', '.join(sorted(map(str, unknown)))}")
+
+    try:
+        fn = primitive.build(params, defaults)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"{name}: {e}") from e
+    return Action(_describe(name, params), name, fn, long_running=name == "wait")
+
+
+def build_dispatch_table(ir_codes: dict, defaults: dict) -> dict[int, Action]:
+    """
+    Compile the `ir_codes` config section into a scancode -> Action table.
+
+    Keys may be ints or hex strings (e.g. "0x87ee01").
+    """
+    table = {}
+    for key, spec in ir_codes.items():
+        scancode = key if isinstance(key, int) else int(key, 16)
+        try:
+            table[scancode] = compile_action(spec, defaults)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"ir_codes[{hex(scancode)}]: {e}") from e
+    return table
@@ -7,6 +7,7 @@ import yaml
 import evdev
 from evdev import ecodes
 from devialet_client import DevialetClient
+from actions import build_dispatch_table
 
 # Configure logging
 logging.basicConfig(
@@ -27,9 +28,14 @@ class PhantomBridge:
             self.config = yaml.safe_load(f)
         
         self.client = DevialetClient(self.config)
-        self.ir_codes = {int(k) if isinstance(k, int) else int(k, 16): v 
-                         for k, v in self.config.get("ir_codes", {}).items()}
         self.volume_step = self.config.get("speaker", {}).get("volume_step", 2)
+        if isinstance(self.volume_step, bool) or not isinstance(self.volume_step, (int, float)) \
+                or self.volume_step <= 0:
+            raise ValueError(f"speaker.volume_step must be a positive number, got {self.volume_step!r}")
+        # Compile key mappings once so each press is a single dict lookup
+        self.ir_codes = build_dispatch_table(self.config.get("ir_codes", {}),
+                                             {"volume_step": self.volume_step})
+        self.is_muted = False
         
         self.last_volume_time = 0.0
         self.debounce_window = self.config.get("speaker", {}).get("debounce_ms", 300) / 1000.0
@@ -62,9 +68,10 @@ class PhantomBridge:
 
     async def process_ir_code(self, scancode: int):
         """
-        Map IR scancodes to actions and execute them via the client.
+        Look up the compiled action for an IR scancode and execute it.
         
-        Includes simple debouncing for all keys.
+        Includes simple debouncing for all keys. For macros and waits the
+        window is measured from when the action finished.
         
         Args:
             scancode (int): Raw IR scancode.
@@ -77,36 +84,21 @@ class PhantomBridge:
         now = time.time()
         # Global debouncing logic
         if now - self.last_volume_time < self.debounce_window:
-            logger.debug(f"Debouncing {action} (too soon)")
+            logger.debug(f"Debouncing {action.name} (too soon)")
             return
         self.last_volume_time = now
 
-        logger.info(f"Action: {action} (from {hex(scancode)})")
+        logger.info(f"Action: {action.name} (from {hex(scancode)})")
 
         try:
-            if action == "volume_up":
-                current_vol = await self.client.get_volume()
-                await self.client.set_volume(current_vol + self.volume_step)
-            elif action == "volume_down":
-                current_vol = await self.client.get_volume()
-                await self.client.set_volume(current_vol - self.volume_step)
-            elif action == "mute":
-                # We attempt to toggle mute.
-                # Since API doesn't easily return mute state in volume GET, we will use a local flag
-                # or just always MUTE if that is the safer default?
-                # Actually, if volume is > 0, we are probably unmuted. 
-                # But let's try to be smart.
-                # If we send 'mute', it mutes. If we are muted, we want to 'unmute'.
-                # Let's try to just send MUTE for now, but really we want toggle.
-                # Let's add a local toggle variable to the class.
-                self.is_muted = not getattr(self, 'is_muted', False)
-                await self.client.set_mute(self.is_muted)
-                
-                # If unmuting, maybe we should also set volume?
-                # For now let's trust the endpoint.
-
+            await action(self)
         except Exception as e:
-            logger.error(f"Failed to execute action {action}: {e}")
+            logger.error(f"Failed to execute action {action.name}: {e}")
+        finally:
+            # Restart the window once a long-running action completes, so IR
+            # repeat frames queued while a macro was running are debounced too.
+            if action.long_running:
+                self.last_volume_time = time.time()
 
     async def run(self):
         # Start client discovery
@@ -1,6 +1,6 @@
 import unittest
 import asyncio
-from unittest.mock import MagicMock, AsyncMock, patch
+from unittest.mock import MagicMock, AsyncMock, patch, call
 
 # Mock evdev before importing main
 import sys
@@ -8,6 +8,7 @@ sys.modules['evdev'] = MagicMock()
 
 from main import PhantomBridge
 from devialet_client import DevialetClient
+from actions import build_dispatch_table
 
 class TestDevialetClient(unittest.IsolatedAsyncioTestCase):
     async def test_clamp_volume(self):
@@ -48,7 +49,7 @@ class TestPhantomBridge(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
         # Create a dummy config
         with open("test_config.yaml", "w") as f:
-            f.write("ir_codes:\n  0x01: volume_up\n  0x02: volume_down\nspeaker:\n  volume_step: 3\n")
+            f.write("ir_codes:\n  0x01: volume_up\n  0x02: volume_down\nspeaker:\n  volume_step: 3\n  debounce_ms: 100\n")
             
     def tearDown(self):
         import os
@@ -90,5 +91,201 @@ class TestPhantomBridge(unittest.IsolatedAsyncioTestCase):
         await bridge.process_ir_code(0x01)
         self.assertEqual(bridge.client.set_volume.call_count, 2)
 
+
+def make_soft_mute_client(volume=50):
+    """AsyncMock client that keeps a volume and emulates DevialetClient's soft mute."""
+    client = AsyncMock()
+    state = {"volume": volume, "last_volume": 20}
+
+    async def get_volume():
+        return state["volume"]
+
+    async def set_volume(volume):
+        state["volume"] = max(0, min(100, volume))
+
+    async def set_mute(mute):
+        if mute and state["volume"] > 0:
+            state["last_volume"], state["volume"] = state["volume"], 0
+        elif not mute and state["volume"] == 0:
+            state["volume"] = state["last_volume"]
+
+    client.get_volume.side_effect = get_volume
+    client.set_volume.side_effect = set_volume
+    client.set_mute.side_effect = set_mute
+    client.state = state
+    return client
+
+
+class TestActionEngine(unittest.IsolatedAsyncioTestCase):
+    def make_bridge(self):
+        bridge = MagicMock()
+        bridge.is_muted = False
+        bridge.client = AsyncMock()
+        bridge.client.get_volume.return_value = 50
+        return bridge
+
+    async def test_per_key_step_and_preset(self):
+        bridge = self.make_bridge()
+        table = build_dispatch_table({
+            0x01: {"action": "volume_up", "step": 5},
+            0x02: {"action": "volume_set", "volume": 30},
+            0x03: "volume_down",
+        }, {"volume_step": 2.5})
+        await table[0x01](bridge)
+        bridge.client.set_volume.assert_called_with(55)
+        await table[0x02](bridge)
+        bridge.client.set_volume.assert_called_with(30)
+        self.assertEqual(bridge.client.get_volume.call_count, 1) # Presets skip the GET
+        await table[0x03](bridge)
+        bridge.client.set_volume.assert_called_with(47.5) # Global step is not forced to int
+
+    async def test_mute_toggle(self):
+        bridge = self.make_bridge()
+        bridge.client = make_soft_mute_client(50)
+        table = build_dispatch_table({0x01: "mute"}, {})
+        await table[0x01](bridge)
+        bridge.client.set_mute.assert_called_with(True)
+        self.assertEqual(bridge.client.state["volume"], 0)
+        await table[0x01](bridge)
+        bridge.client.set_mute.assert_called_with(False)
+        self.assertEqual(bridge.client.state["volume"], 50)
+        self.assertFalse(bridge.is_muted)
+
+    async def test_mute_after_preset_takes_one_press(self):
+        bridge = self.make_bridge()
+        bridge.client = make_soft_mute_client(50)
+        table = build_dispatch_table({
+            0x01: "mute",
+            0x02: {"action": "volume_set", "volume": 40},
+            0x03: {"action": "volume_set", "volume": 0},
+        }, {})
+
+        await table[0x01](bridge)
+        await table[0x02](bridge)
+        self.assertFalse(bridge.is_muted)
+        await table[0x01](bridge) # A single press mutes again
+        self.assertEqual(bridge.client.state["volume"], 0)
+
+        await table[0x03](bridge)
+        self.assertTrue(bridge.is_muted)
+        await table[0x01](bridge) # A single press unmutes from a 0 preset
+        self.assertEqual(bridge.client.state["volume"], 40)
+
+    async def test_macro_drops_steps_overridden_by_preset(self):
+        bridge = self.make_bridge()
+        table = build_dispatch_table({
+            0x01: {"macro": [
+                "unmute",
+                {"action": "volume_set", "volume": 10},
+                {"action": "volume_set", "volume": 25},
+                {"action": "volume_up", "step": 1},
+            ]},
+        }, {})
+        self.assertEqual(table[0x01].name, "macro(volume_set(volume=25) -> volume_up(step=1))")
+        await table[0x01](bridge)
+        bridge.client.set_mute.assert_not_called()
+        self.assertEqual(bridge.client.set_volume.call_args_list, [call(25), call(51)])
+
+    async def test_macro_keeps_steps_separated_by_wait(self):
+        bridge = self.make_bridge()
+        table = build_dispatch_table({
+            0x01: {"macro": ["mute_on", {"action": "wait", "ms": 0}, {"action": "volume_set", "volume": 25}]},
+        }, {})
+        await table[0x01](bridge)
+        bridge.client.set_mute.assert_called_once_with(True)
+        bridge.client.set_volume.assert_called_once_with(25)
+
+    def test_invalid_config_rejected_at_load(self):
+        invalid = [
+            "explode",
+            {"action": "volume_set"},
+            {"action": "volume_up", "stepp": 5},
+            {"action": "volume_up", "step": None},
+            {"action": "volume_up", "step": 0},
+            {"action": "volume_down", "step": -2},
+            {"action": "volume_set", "volume": 500},
+            {"action": "volume_set", "volume": "30"},
+            {"action": "wait", "ms": -1},
+            {"action": ["volume_up"]},
+            {"macro": ["volume_up"], "action": "volume_up"},
+            {"macro": []},
+            {"macro": [["volume_up"]]},
+        ]
+        for spec in invalid:
+            with self.subTest(spec=spec):
+                with self.assertRaisesRegex(ValueError, r"ir_codes\[0x1\]"):
+                    build_dispatch_table({0x01: spec}, {})
+
+
+class TestBridgeActionConfig(unittest.IsolatedAsyncioTestCase):
+    def write_config(self, speaker="  volume_step: 3\n  debounce_ms: 100\n"):
+        with open("test_config.yaml", "w") as f:
+            f.write(
+                "speaker:\n" + speaker +
+                "ir_codes:\n"
+                "  0x01: {action: volume_up, step: 7}\n"
+                "  0x02: {action: volume_set, volume: 40}\n"
+                "  0x03:\n"
+                "    macro:\n"
+                "      - mute_off\n"
+                "      - {action: wait, ms: 150}\n"
+                "      - {action: volume_set, volume: 25}\n"
+            )
+
+    def setUp(self):
+        self.write_config()
+
+    def tearDown(self):
+        import os
+        if os.path.exists("test_config.yaml"):
+            os.remove("test_config.yaml")
+
+    async def test_dict_forms_from_yaml(self):
+        bridge = PhantomBridge("test_config.yaml")
+        bridge.client = AsyncMock()
+        bridge.client.get_volume.return_value = 50
+
+        await bridge.process_ir_code(0x01)
+        bridge.client.set_volume.assert_called_with(57)
+
+        bridge.last_volume_time = 0
+        await bridge.process_ir_code(0x02)
+        bridge.client.set_volume.assert_called_with(40)
+
+        bridge.last_volume_time = 0
+        with patch("actions.asyncio.sleep", AsyncMock()):
+            await bridge.process_ir_code(0x03)
+        bridge.client.set_mute.assert_called_once_with(False)
+        bridge.client.set_volume.assert_called_with(25)
+
+    def test_invalid_volume_step_names_setting(self):
+        for value in ("abc", "0", "-1", "true"):
+            with self.subTest(value=value):
+                self.write_config(f"  volume_step: {value}\n")
+                with self.assertRaisesRegex(ValueError, "speaker.volume_step"):
+                    PhantomBridge("test_config.yaml")
+
+    async def test_repeat_after_slow_macro_is_debounced(self):
+        bridge = PhantomBridge("test_config.yaml")
+        bridge.client = AsyncMock()
+
+        # The macro's 150ms wait outlasts the 100ms debounce window
+        await bridge.process_ir_code(0x03)
+        # A repeat frame queued while the macro ran arrives right after it finishes
+        await bridge.process_ir_code(0x03)
+        self.assertEqual(bridge.client.set_volume.call_count, 1)
+
+    async def test_simple_key_window_measured_from_press(self):
+        bridge = PhantomBridge("test_config.yaml")
+        bridge.client = AsyncMock()
+        bridge.client.get_volume.return_value = 50
+
+        with patch("main.time.time", side_effect=[1000.0, 1000.11]):
+            await bridge.process_ir_code(0x01)
+            await bridge.process_ir_code(0x01)
+        # A slow round trip does not push back the next held-key repeat
+        self.assertEqual(bridge.last_volume_time, 1000.11)
+        self.assertEqual(bridge.client.set_volume.call_count, 2)
+
 if __name__ == '__main__':
     unittest.main()